@@ -8,9 +8,9 @@ import logging
 import os
 import re
 import subprocess
-import tarfile
 import tempfile
-from typing import Union
+import threading
+from typing import Any, Union
 
 GitVersionRef = namedtuple(
     "GitVersionRef",
@@ -34,50 +34,150 @@ def get_toplevel_path(cwd: Union[str, None] = None) -> str:
         "rev-parse",
         "--show-toplevel",
     )
-    output = subprocess.check_output(cmd, cwd=cwd).decode()
+    output = subprocess.check_output(cmd, cwd=cwd, encoding="utf-8")
     return output.rstrip("\n")
 
 
-def get_all_refs(gitroot: str) -> Iterable[GitVersionRef]:
-    """Execute Git command to get all references"""
+def get_all_refs(
+    gitroot: str, patterns: tuple[str, ...] = ("refs/heads/", "refs/tags/", "refs/remotes/")
+) -> Iterable[GitVersionRef]:
+    """Execute Git command to get all branches and tags, optionally limited to the given ref patterns"""
     cmd = (
         "git",
         "for-each-ref",
         "--format",
-        "%(objectname)\t%(refname)\t%(creatordate:iso)",
-        "refs",
+        "%(objectname)%00%(objecttype)%00%(*objectname)%00%(*objecttype)%00%(refname)%00%(creatordate:iso-strict)",
+        *patterns,
     )
-    output = subprocess.check_output(cmd, cwd=gitroot).decode()
-    for line in output.splitlines():
-        is_remote = False
-        fields = line.strip().split("\t")
-        if len(fields) != 3:
-            continue
+    # Parse references while git is still listing them, instead of reading the whole output first.
+    # Fields are separated by NUL bytes, which can't occur in any of them, and only decoded when used
+    with subprocess.Popen(cmd, cwd=gitroot, stdout=subprocess.PIPE) as proc:
+        assert proc.stdout is not None
+        for line in proc.stdout:
+            is_remote = False
+            fields = line.rstrip(b"\n").split(b"\x00")
+            if len(fields) != 6:
+                continue
 
-        commit = fields[0]
-        refname = fields[1]
-        creatordate = datetime.datetime.strptime(fields[2], "%Y-%m-%d %H:%M:%S %z")
+            # Annotated tags point to a tag object, use the commit it refers to instead. This way all
+            # references to the same commit share the same commit hash. Skip references which don't point
+            # to a commit at all, e.g. tags of trees, as they have no creator date either
+            objectname, objecttype = (fields[2], fields[3]) if fields[2] else (fields[0], fields[1])
+            if objecttype != b"commit" or not fields[5]:
+                continue
+            commit = objectname.decode("ascii")
+            refname = fields[4].decode("utf-8")
+            # Newer versions of git print "Z" for UTC, which fromisoformat only accepts since Python 3.11
+            creatordate = datetime.datetime.fromisoformat(fields[5].decode("ascii").replace("Z", "+00:00"))
 
-        # Parse refname
-        matchobj = re.match(r"^refs/(heads|tags|remotes/[^/]+)/(\S+)$", refname)
-        if not matchobj:
-            continue
-        source = matchobj.group(1)
-        name = matchobj.group(2)
+            # Parse refname
+            matchobj = re.match(r"^refs/(heads|tags|remotes/[^/]+)/(\S+)$", refname)
+            if not matchobj:
+                continue
+            source = matchobj.group(1)
+            name = matchobj.group(2)
+
+            if source.startswith("remotes/"):
+                is_remote = True
+
+            yield GitVersionRef(name, commit, source, is_remote, refname, creatordate)
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+
+
+class GitCatFileBatch:
+    """Long-running ``git cat-file --batch-check`` process to look up files in Git references"""
+
+    def __init__(self, gitroot: str):
+        cmd = (
+            "git",
+            "cat-file",
+            "--batch-check=%(objectname) %(objecttype)",
+        )
+        self._proc = subprocess.Popen(  # pylint: disable=consider-using-with
+            cmd,
+            cwd=gitroot,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            bufsize=0,
+        )
+
+    def __enter__(self) -> "GitCatFileBatch":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def exists(self, refname: str, filename: str) -> bool:
+        """Check if file exists in the given reference. The filename must use ``/`` as path separator"""
+        self._write_queries([(refname, filename)])
+        return self._read_reply() is not None
+
+    def exists_many(self, queries: list[tuple[str, str]]) -> dict[tuple[str, str], bool]:
+        """Check if files exist in the given references"""
+        return {query: objectname is not None for query, objectname in self.get_object_names(queries).items()}
 
-        if source.startswith("remotes/"):
-            is_remote = True
+    def get_object_names(self, queries: list[tuple[str, str]]) -> dict[tuple[str, str], Union[str, None]]:
+        """Get the object names (hashes) of files in the given references, or None for missing files. An empty
+        filename refers to the root tree. Queries are written from a separate thread while the replies are read,
+        so that neither side blocks on a full pipe"""
+        writer = threading.Thread(target=self._write_queries, args=(queries,), daemon=True)
+        writer.start()
+        try:
+            return {query: self._read_reply() for query in queries}
+        finally:
+            writer.join()
 
-        yield GitVersionRef(name, commit, source, is_remote, refname, creatordate)
+    def _write_queries(self, queries: list[tuple[str, str]]) -> None:
+        assert self._proc.stdin is not None
+        self._proc.stdin.write(b"".join(f"{refname}:{filename}\n".encode() for refname, filename in queries))
 
+    def _read_reply(self) -> Union[str, None]:
+        assert self._proc.stdout is not None
+        reply = self._proc.stdout.readline()
+        if not reply:
+            raise OSError("git cat-file process terminated unexpectedly")
+        objectname, _, objecttype = reply.rstrip(b"\n").rpartition(b" ")
+        if objecttype in (b"missing", b"ambiguous"):
+            return None
+        return objectname.decode("ascii")
 
-def get_refs(
+    def close(self) -> None:
+        """Close stdin of the git process and wait for it to exit"""
+        if self._proc.stdin is not None:
+            self._proc.stdin.close()
+        if self._proc.stdout is not None:
+            self._proc.stdout.close()
+        self._proc.wait()
+
+
+def get_refs(  # pylint: disable=too-many-branches,too-many-locals
     gitroot: str, tag_whitelist: str, branch_whitelist: str, remote_whitelist: str, files: tuple[str, ...] = ()
 ) -> Iterable[GitVersionRef]:
     """Filter Git references"""
-    for ref in get_all_refs(gitroot):
+    if os.sep != "/":
+        # Git requires / path sep, make sure we use that
+        files = tuple(filename.replace(os.sep, "/") for filename in files)
+
+    tag_re = re.compile(tag_whitelist) if tag_whitelist else None
+    branch_re = re.compile(branch_whitelist) if branch_whitelist else None
+    remote_re = re.compile(remote_whitelist) if remote_whitelist else None
+
+    # Let git list only the kinds of references which can match the whitelists
+    patterns = []
+    if tag_re:
+        patterns.append("refs/tags/")
+    if branch_re:
+        patterns.append("refs/heads/")
+        if remote_re:
+            patterns.append("refs/remotes/")
+    if not patterns:
+        return
+
+    refs = []
+    for ref in get_all_refs(gitroot, tuple(patterns)):
         if ref.source == "tags":
-            if not tag_whitelist or not re.match(tag_whitelist, ref.name):
+            if not tag_re or not tag_re.match(ref.name):
                 logger.debug(
                     "Skipping '%s' because tag '%s' doesn't match the whitelist pattern",
                     ref.refname,
@@ -85,23 +185,23 @@ def get_refs(
                 )
                 continue
         elif ref.source == "heads":
-            if not branch_whitelist or not re.match(branch_whitelist, ref.name):
+            if not branch_re or not branch_re.match(ref.name):
                 logger.debug(
                     "Skipping '%s' because branch '%s' doesn't match the whitelist pattern",
                     ref.refname,
                     ref.name,
                 )
                 continue
-        elif ref.is_remote and remote_whitelist:
+        elif ref.is_remote and remote_re:
             remote_name = ref.source.partition("/")[2]
-            if not re.match(remote_whitelist, remote_name):
+            if not remote_re.match(remote_name):
                 logger.debug(
                     "Skipping '%s' because remote '%s' doesn't match the whitelist pattern",
                     ref.refname,
                     remote_name,
                 )
                 continue
-            if not branch_whitelist or not re.match(branch_whitelist, ref.name):
+            if not branch_re or not branch_re.match(ref.name):
                 logger.debug(
                     "Skipping '%s' because branch '%s' doesn't match the whitelist pattern",
                     ref.refname,
@@ -112,9 +212,17 @@ def get_refs(
             logger.debug("Skipping '%s' because its not a branch or tag", ref.refname)
             continue
 
-        missing_files = [
-            filename for filename in files if filename != "." and not file_exists(gitroot, ref.refname, filename)
-        ]
+        refs.append(ref)
+
+    # Check the required files of all references with one batch of queries
+    queries = [(ref.refname, filename) for ref in refs for filename in files if filename != "."]
+    found: dict[tuple[str, str], bool] = {}
+    if queries:
+        with GitCatFileBatch(gitroot) as batch:
+            found = batch.exists_many(queries)
+
+    for ref in refs:
+        missing_files = [filename for filename in files if filename != "." and not found[(ref.refname, filename)]]
         if missing_files:
             logger.debug(
                 "Skipping '%s' because it lacks required files: %r",
@@ -126,35 +234,30 @@ def get_refs(
         yield ref
 
 
-def file_exists(gitroot: str, refname: str, filename: str) -> bool:
-    """Execute Git command to check if file exists"""
+def copy_tree(
+    gitroot: str,
+    dst: str,
+    reference: GitVersionRef,
+    sourcepath: str = ".",
+    base_env: Union[dict[str, str], None] = None,
+) -> None:
+    """Execute Git commands to copy repository tree. The git commands run with base_env, or the current
+    environment if it is not given. Unlike ``git archive``, ``export-ignore`` and ``export-subst`` attributes
+    are not applied, while smudge filters (e.g. git-lfs) are"""
     if os.sep != "/":
-        # Git requires / path sep, make sure we use that
-        filename = filename.replace(os.sep, "/")
-
-    cmd = (
-        "git",
-        "cat-file",
-        "-e",
-        f"{refname}:{filename}",
-    )
-    proc = subprocess.run(cmd, cwd=gitroot, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
-    return proc.returncode == 0
+        sourcepath = sourcepath.replace(os.sep, "/")
+    sourcepath = sourcepath.strip("/")
 
-
-def copy_tree(gitroot: str, dst: str, reference: GitVersionRef, sourcepath: str = ".") -> None:
-    """Execute Git command to copy repository tree"""
-    with tempfile.SpooledTemporaryFile() as fp:
-        cmd = (
-            "git",
-            "archive",
-            "--format",
-            "tar",
-            reference.commit,
-            "--",
-            sourcepath,
+    # Let git write the files itself from a temporary index, so that the index of the repository is left untouched
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**(os.environ if base_env is None else base_env), "GIT_INDEX_FILE": os.path.join(tmp, "index")}
+        if sourcepath in ("", "."):
+            read_tree_args: tuple[str, ...] = (reference.commit,)
+        else:
+            read_tree_args = (f"--prefix={sourcepath}/", f"{reference.commit}:{sourcepath}")
+        subprocess.check_call(("git", "read-tree", *read_tree_args), cwd=gitroot, env=env)
+        subprocess.check_call(
+            ("git", "checkout-index", "--all", "--force", f"--prefix={os.path.join(os.path.abspath(dst), '')}"),
+            cwd=gitroot,
+            env=env,
         )
-        subprocess.check_call(cmd, cwd=gitroot, stdout=fp)
-        fp.seek(0)
-        with tarfile.TarFile(fileobj=fp) as tarfp:
-            tarfp.extractall(dst)
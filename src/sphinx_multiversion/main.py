@@ -3,14 +3,17 @@
 
 import argparse
 from collections.abc import Iterator
+import concurrent.futures
 import contextlib
+import copy
 import datetime
-import itertools
+import hashlib
 import json
 import logging
-import multiprocessing
+import mmap
 import os
 import pathlib
+import pickle
 import re
 import shutil
 import string
@@ -19,13 +22,16 @@ import sys
 import tempfile
 from typing import Any, Union
 
-from packaging.version import parse
+from packaging.version import InvalidVersion, parse
+from sphinx import __version__ as sphinx_version
 from sphinx.config import Config as sphinx_config
 from sphinx.errors import ConfigError as sphinx_config_error
 from sphinx.project import Project as sphinx_project
 
 from . import git, sphinx
 
+logger = logging.getLogger(__name__)
+
 
 @contextlib.contextmanager
 def _set_working_dir(path: str) -> Iterator[None]:
@@ -38,75 +44,170 @@ def _set_working_dir(path: str) -> Iterator[None]:
         os.chdir(prev_cwd)
 
 
-# TODO: Using type annotation "multiprocessing.Queue[Union[sphinx_config, Exception]]"
-#  for q parameter breaks static checks and unit tests, find a way to fix this
-def _create_sphinx_config_worker(
-    q: Any,
-    confpath: str,
-    confoverrides: dict[str, str],
-    add_defaults: bool,
-) -> None:
-    """Create a worker to load sphinx configuration"""
+def _read_sphinx_config(confpath: str, confoverrides: dict[str, str], add_defaults: bool) -> sphinx_config:
+    """Read sphinx configuration. Modules and paths added by conf.py are removed afterwards, so that
+    the conf.py of each version imports its own version of them. Changes to environment variables are
+    undone as well, so that they don't leak to other versions"""
+    initial_modules = set(sys.modules)
+    initial_path = sys.path.copy()
+    initial_environ = os.environ.copy()
     try:
         with _set_working_dir(confpath):
             current_config = sphinx_config.read(
                 confpath,
                 confoverrides,
             )
+    finally:
+        sys.path[:] = initial_path
+        for name in set(sys.modules) - initial_modules:
+            del sys.modules[name]
+        # Only touch the variables which changed, other threads may use the environment meanwhile
+        for key in set(os.environ) - set(initial_environ):
+            del os.environ[key]
+        for key, value in initial_environ.items():
+            if os.environ.get(key) != value:
+                os.environ[key] = value
+
+    if add_defaults:
+        current_config.add("smv_tag_whitelist", sphinx.DEFAULT_TAG_WHITELIST, "html", str)
+        current_config.add(
+            "smv_branch_whitelist",
+            sphinx.DEFAULT_TAG_WHITELIST,
+            "html",
+            str,
+        )
+        current_config.add(
+            "smv_remote_whitelist",
+            sphinx.DEFAULT_REMOTE_WHITELIST,
+            "html",
+            str,
+        )
+        current_config.add(
+            "smv_released_pattern",
+            sphinx.DEFAULT_RELEASED_PATTERN,
+            "html",
+            str,
+        )
+        current_config.add(
+            "smv_outputdir_format",
+            sphinx.DEFAULT_OUTPUTDIR_FORMAT,
+            "html",
+            str,
+        )
+        current_config.add("smv_prefer_remote_refs", False, "html", bool)
+        current_config.add("smv_symver_pattern", r"^[^\d]*(\d*\.\d*).*$", "html", str)
+    current_config.pre_init_values()
+    current_config.init_values()
+
+    return current_config
+
+
+def _load_sphinx_config(
+    confpath: str,
+    confoverrides: dict[str, str],
+    config_cache: dict[tuple[Any, ...], sphinx_config],
+    add_defaults: bool = False,
+) -> sphinx_config:
+    """Load sphinx config. Loaded configs are cached in config_cache by the location and content of
+    conf.py, e.g. for git refs pointing to the same commit"""
+    # conf.py may import other files next to it, so the location is part of the key, not just the content
+    with open(os.path.join(confpath, "conf.py"), mode="rb") as f:
+        conf_digest = hashlib.blake2b(f.read()).digest()
+    key = (os.path.realpath(confpath), conf_digest, tuple(sorted(confoverrides.items())), add_defaults)
+
+    if key not in config_cache:
+        config_cache[key] = _read_sphinx_config(confpath, confoverrides, add_defaults)
+    return copy.deepcopy(config_cache[key])
+
+
+def _load_cached_sphinx_config(
+    cachepath: str,
+    confpath: str,
+    confoverrides: dict[str, str],
+    config_cache: dict[tuple[Any, ...], sphinx_config],
+) -> sphinx_config:
+    """Load sphinx config of a git ref, reusing the config pickled to the cache directory of its commit
+    by a previous run if possible"""
+    key = json.dumps([sphinx_version, os.path.relpath(confpath, cachepath), confoverrides], sort_keys=True)
+    picklepath = os.path.join(cachepath, f"config-{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}.pickle")
+    try:
+        with open(picklepath, mode="rb") as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.PickleError):
+        pass
 
-        if add_defaults:
-            current_config.add("smv_tag_whitelist", sphinx.DEFAULT_TAG_WHITELIST, "html", str)
-            current_config.add(
-                "smv_branch_whitelist",
-                sphinx.DEFAULT_TAG_WHITELIST,
-                "html",
-                str,
-            )
-            current_config.add(
-                "smv_remote_whitelist",
-                sphinx.DEFAULT_REMOTE_WHITELIST,
-                "html",
-                str,
-            )
-            current_config.add(
-                "smv_released_pattern",
-                sphinx.DEFAULT_RELEASED_PATTERN,
-                "html",
-                str,
-            )
-            current_config.add(
-                "smv_outputdir_format",
-                sphinx.DEFAULT_OUTPUTDIR_FORMAT,
-                "html",
-                str,
-            )
-            current_config.add("smv_prefer_remote_refs", False, "html", bool)
-            current_config.add("smv_symver_pattern", r"^[^\d]*(\d*\.\d*).*$", "html", str)
-        current_config.pre_init_values()
-        current_config.init_values()
-    except Exception as e:  # pylint: disable=broad-except
-        q.put(e)
-        return
+    current_config = _load_sphinx_config(confpath, confoverrides, config_cache)
+    try:
+        with tempfile.NamedTemporaryFile(mode="wb", dir=cachepath, delete=False) as tmpfile:
+            pickle.dump(current_config, tmpfile)
+        os.replace(tmpfile.name, picklepath)
+    except OSError:
+        logger.debug("Failed to cache config from %s in %s", confpath, picklepath)
+    return current_config
 
-    q.put(current_config)
 
+def _copy_tree_cached(
+    gitroot: str, cachepath: str, gitref: git.GitVersionRef, base_env: Union[dict[str, str], None] = None
+) -> None:
+    """Copy repository tree of a git ref to the "tree" folder of cachepath, unless it has been copied
+    there already"""
+    treepath = os.path.join(cachepath, "tree")
+    if os.path.isdir(treepath):
+        return
 
-def _load_sphinx_config(confpath: str, confoverrides: dict[str, str], add_defaults: bool = False) -> sphinx_config:
-    """Load sphinx config"""
-    q: Any = multiprocessing.Queue()
-    proc = multiprocessing.Process(
-        target=_create_sphinx_config_worker,
-        args=(q, confpath, confoverrides, add_defaults),
+    # Copy to a temporary folder first and move it in place once complete, so that other runs sharing the
+    # cache never see an incomplete tree
+    os.makedirs(cachepath, exist_ok=True)
+    tmp_treepath = tempfile.mkdtemp(dir=cachepath)
+    try:
+        git.copy_tree(gitroot, tmp_treepath, gitref, base_env=base_env)
+        os.rename(tmp_treepath, treepath)
+    except OSError:
+        shutil.rmtree(tmp_treepath, ignore_errors=True)
+        # Another run finished copying the same tree first
+        if not os.path.isdir(treepath):
+            raise
+    except BaseException:
+        shutil.rmtree(tmp_treepath, ignore_errors=True)
+        raise
+
+
+def _get_default_cache_dir() -> str:
+    """Get the default directory for caching git trees and configs between runs"""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "sphinx-multiversion")
+
+
+def _get_source_trees(gitroot: str, sourcedir: str, gitrefs: list[git.GitVersionRef]) -> dict[str, Union[str, None]]:
+    """Get the hash of the source directory tree of each commit of the git refs"""
+    commits = sorted({gitref.commit for gitref in gitrefs})
+    if not commits:
+        return {}
+    sourcepath = "" if sourcedir == os.curdir else sourcedir.replace(os.sep, "/")
+    with git.GitCatFileBatch(gitroot) as batch:
+        objectnames = batch.get_object_names([(commit, sourcepath) for commit in commits])
+    return {commit: objectname for (commit, _), objectname in objectnames.items()}
+
+
+def _outputdir_format_uses_config(outputdir_format: str) -> bool:
+    """Check if the outputdir format refers to the config of a version"""
+    return any(
+        "config" in (field_name or "") or "config" in (format_spec or "")
+        for _, field_name, format_spec, _ in string.Formatter().parse(outputdir_format)
     )
-    proc.start()
-    proc.join()
-    result = q.get_nowait()
-    if isinstance(result, Exception):
-        raise result
-    return result
 
 
-def _get_python_flags() -> Iterator[str]:  # pylint: disable=too-many-branches
+def _get_version_sort_key(refname: str) -> tuple[Any, ...]:
+    """Get key for sorting git refs by the version in their name. Refs which are not named after a
+    version, e.g. branches like "main", are sorted by name before all versions"""
+    name = refname.split("/")[-1]
+    try:
+        return (1, parse(name))
+    except InvalidVersion:
+        return (0, name)
+
+
+def _compute_python_flags() -> Iterator[str]:  # pylint: disable=too-many-branches
     """Get Python runtime flags that were provided through command line arguments or environment vars"""
     if sys.flags.bytes_warning:
         yield "-b"
@@ -138,6 +239,10 @@ def _get_python_flags() -> Iterator[str]:  # pylint: disable=too-many-branches
             yield from ("-X", f"{option}={value}")
 
 
+# The runtime flags don't change while running, so pass the same ones to every sphinx-build
+_PYTHON_FLAGS = tuple(_compute_python_flags())
+
+
 def _generate_html_redirection_page(path: str = "") -> str:
     """Generate markup for HTML page which redirects to the latest released docs"""
     return fr'''<!-- This page is created automatically by documentation builder -->
@@ -152,6 +257,17 @@ def _generate_html_redirection_page(path: str = "") -> str:
 </html>'''
 
 
+def _positive_int(value: str) -> int:
+    """Parse a positive integer command line argument"""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"invalid positive int value: {value!r}")
+    return number
+
+
 def _create_argument_parser() -> argparse.ArgumentParser:
     """Create parser with custom arguments"""
     parser = argparse.ArgumentParser()
@@ -204,31 +320,187 @@ def _create_argument_parser() -> argparse.ArgumentParser:
         dest="dev_path",
         help=("path where to store the development version of docs " "(default: root build directory)"),
     )
+    parser.add_argument(
+        "--cache-dir",
+        metavar="PATH",
+        help=(
+            "keep copies of git trees and their configs in this directory, to be reused by later runs. "
+            "Use 'auto' for $XDG_CACHE_HOME/sphinx-multiversion"
+        ),
+    )
+    parser.add_argument(
+        "--doctree-cache",
+        metavar="PATH",
+        help=(
+            "keep the doctree caches of all versions in this directory, so that later runs only rebuild changed "
+            "files (default: a temporary directory)"
+        ),
+    )
+    parser.add_argument(
+        "--build-jobs",
+        metavar="N",
+        type=_positive_int,
+        help="number of versions to build in parallel (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--symlink-static",
+        action="store_true",
+        help=(
+            "replace the _static folder of older versions with a symlink to the _static folder of the development "
+            "version instead of rewriting paths in their HTML and CSS files. Falls back to hard links if symlinks "
+            "can't be created"
+        ),
+    )
 
     return parser
 
 
+def _iter_html_css_files(path: str) -> Iterator[str]:
+    """Recursively find HTML and CSS files in a directory"""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_html_css_files(entry.path)
+            elif entry.name.endswith((".html", ".css")):
+                yield entry.path
+
+
+def _update_static_path_in_file(file_path: str) -> None:
+    """Change (in-place) path of _static folder in a HTML or CSS file to the
+    _static folder of dev version"""
+    # Work on raw bytes, the replaced text is ASCII so there is no need to decode the file
+    with open(file_path, mode="rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # Don't read or rewrite files which don't refer to static files
+            if mm.find(b"_static") == -1:
+                return
+            # Use relative path to the _static folder of dev version
+            filedata = mm[:].replace(b"_static", b"../../_static")
+    # Replace the file only once it has been completely written
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, mode="wb") as f:
+        f.write(filedata)
+    os.replace(tmp_path, file_path)
+
+
 def _update_static_path(output_dir: str) -> None:
     """Change (in-place) path of _static folder in all HTML and CSS files of
     older versions of documentation to the _static folder of dev version, then
     remove the local _static folder. This allows to use a single copy of static
     files across all versions of documentation"""
-
-    for root, _, files in os.walk(output_dir):
-        for file in files:
-            if file.endswith(".html") or file.endswith(".css"):
-                file_path = os.path.join(root, file)
-                with open(file_path, mode="r", encoding="utf-8") as f:
-                    filedata = f.read()
-                # Use relative path to the _static folder of dev version
-                filedata = filedata.replace("_static", "../../_static")
-                with open(file_path, mode="w", encoding="utf-8") as f:
-                    f.write(filedata)
+    # Most of the time is spent waiting for the file system, so handle the files in threads
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+        for _ in executor.map(_update_static_path_in_file, _iter_html_css_files(output_dir)):
+            pass
 
     # Remove the _static folder
     shutil.rmtree(os.path.join(output_dir, "_static"))
 
 
+def _link_or_copy_file(src: str, dst: str) -> None:
+    """Create a hard link to a file, or copy it if hard links are not supported"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _link_static_path(output_dir: str, dev_static_path: str) -> None:
+    """Replace the _static folder of older versions of documentation with a
+    symbolic link to the _static folder of dev version, or with hard links to
+    its files if symbolic links can't be created. Unlike _update_static_path,
+    this doesn't need to rewrite any HTML or CSS files"""
+    static_path = os.path.join(output_dir, "_static")
+    # Sphinx doesn't copy the static files again if no pages needed to be rebuilt
+    shutil.rmtree(static_path, ignore_errors=True)
+    try:
+        os.symlink(os.path.relpath(dev_static_path, output_dir), static_path, target_is_directory=True)
+    except OSError:
+        shutil.copytree(dev_static_path, static_path, copy_function=_link_or_copy_file)
+
+
+def _build_version(  # pylint: disable=too-many-arguments,too-many-locals
+    version_name: str,
+    data: dict[str, Any],
+    argv: list[str],
+    args: argparse.Namespace,
+    define_templates: list[string.Template],
+    latest_version: str,
+    confdir_absolute: str,
+    cwd_relative: str,
+    doctree_cache: str,
+    base_env: dict[str, str],
+) -> None:
+    """Run sphinx-build for a single version of documentation"""
+    os.makedirs(data["outputdir"], exist_ok=True)
+    # Remove _static links of a previous build, so that sphinx doesn't copy files into the dev version. The
+    # _static folder of other versions is replaced after the build anyway, and may contain hard links
+    static_path = os.path.join(data["outputdir"], "_static")
+    if os.path.islink(static_path):
+        os.unlink(static_path)
+    elif args.dev_name and version_name != args.dev_name:
+        shutil.rmtree(static_path, ignore_errors=True)
+
+    defines = [arg for template in define_templates for arg in ("-D", template.safe_substitute(data))]
+
+    # Paths to static files are rewritten in all pages after the build, so all pages need to be written again
+    # even if the doctree cache of a previous run is up to date
+    rewrite_static_path = bool(args.dev_name) and version_name != args.dev_name and not args.symlink_static
+    write_all = ["-a"] if rewrite_static_path and args.doctree_cache else []
+
+    current_argv = argv.copy()
+    current_argv.extend(
+        [
+            *write_all,
+            *defines,
+            "-D",
+            f"smv_latest_version={latest_version}",
+            "-D",
+            f"smv_current_version={version_name}",
+            "-c",
+            confdir_absolute,
+            data["sourcedir"],
+            data["outputdir"],
+            *args.filenames,
+        ]
+    )
+    logger.debug("Running sphinx-build with args: %r", current_argv)
+    cmd = (
+        sys.executable,
+        *_PYTHON_FLAGS,
+        "-m",
+        "sphinx",
+        "-d",
+        # Use a separate doctree cache for each version, as the builds run in parallel
+        os.path.join(doctree_cache, version_name),
+        *current_argv,
+    )
+    current_cwd = os.path.join(data["basedir"], cwd_relative)
+    env = {
+        **base_env,
+        "SPHINX_MULTIVERSION_NAME": data["name"],
+        "SPHINX_MULTIVERSION_VERSION": data["version"],
+        "SPHINX_MULTIVERSION_RELEASE": data["release"],
+        "SPHINX_MULTIVERSION_SOURCEDIR": data["sourcedir"],
+        "SPHINX_MULTIVERSION_OUTPUTDIR": data["outputdir"],
+        "SPHINX_MULTIVERSION_CONFDIR": data["confdir"],
+    }
+    # File descriptors opened by Python are not inheritable anyway, so skip closing them all in the child
+    subprocess.check_call(cmd, cwd=current_cwd, env=env, close_fds=False)
+
+    # Use "master" copy of static files for all documentation releases. Links are created once all versions are built
+    if rewrite_static_path:
+        _update_static_path(data["outputdir"])
+
+
+def _build_versions(jobs: list[tuple[Any, ...]]) -> None:
+    """Run sphinx-build for several versions of documentation one after another"""
+    for job in jobs:
+        _build_version(*job)
+
+
 def main(  # pylint: disable=too-many-branches,too-many-locals,too-many-statements
     argv: Union[list[str], None] = None
 ) -> int:
@@ -241,8 +513,6 @@ def main(  # pylint: disable=too-many-branches,too-many-locals,too-many-statemen
     if args.noconfig:
         return 1
 
-    logger = logging.getLogger(__name__)
-
     sourcedir_absolute = os.path.abspath(args.sourcedir)
     confdir_absolute = os.path.abspath(args.confdir) if args.confdir is not None else sourcedir_absolute
 
@@ -252,8 +522,13 @@ def main(  # pylint: disable=too-many-branches,too-many-locals,too-many-statemen
         key, _, value = d.partition("=")
         confoverrides[key] = value
 
+    # Environment of the git and sphinx-build processes, taken before any conf.py is run
+    base_env = os.environ.copy()
+
     # Parse config
-    config = _load_sphinx_config(confdir_absolute, confoverrides, add_defaults=True)
+    # Configs loaded during this run, refs pointing to the same commit share them
+    config_cache: dict[tuple[Any, ...], sphinx_config] = {}
+    config = _load_sphinx_config(confdir_absolute, confoverrides, config_cache, add_defaults=True)
 
     # Get relative paths to root of git repository
     gitroot = str(pathlib.Path(git.get_toplevel_path(cwd=sourcedir_absolute)).resolve())
@@ -279,98 +554,138 @@ def main(  # pylint: disable=too-many-branches,too-many-locals,too-many-statemen
         files=(sourcedir, conffile),
     )
 
-    # Order git refs
-    if config.smv_prefer_remote_refs:
-        gitrefs = sorted(gitrefs, key=lambda x: (not x.is_remote, *x))
-    else:
-        gitrefs = sorted(gitrefs, key=lambda x: (x.is_remote, *x))
-
-    # git refs by default are just strings (e.g. "refs/tags/10.11"), and we need
-    # to extract semver to be able to sort versions
-    gitrefs.sort(key=lambda gitref: parse(gitref.refname.split("/")[-1]))
+    # Order git refs by version, then by local/remote preference. Git refs by default
+    # are just strings (e.g. "refs/tags/10.11"), and we need to extract semver to be
+    # able to sort versions
+    gitrefs = sorted(
+        gitrefs,
+        key=lambda x: (_get_version_sort_key(x.refname), x.is_remote != config.smv_prefer_remote_refs, *x),
+    )
 
-    logger = logging.getLogger(__name__)
+    released_re = re.compile(config.smv_released_pattern)
     released_versions = []
 
-    with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as doctree_cache:
+    # Without a development version, the metadata of versions which are skipped is not needed by any build.
+    # If their output directories don't depend on their configs, check them before copying any Git trees
+    if args.skip_if_outputdir_exists and gitrefs and not args.dev_name and not args.dump_metadata:
+        outputroot = os.path.abspath(args.outputdir)
+        if not _outputdir_format_uses_config(config.smv_outputdir_format) and all(
+            os.path.isdir(os.path.join(outputroot, config.smv_outputdir_format.format(ref=gitref, config=None)))
+            for gitref in gitrefs
+        ):
+            logger.warning("Skipping all versions because their outputdirs already exist")
+            return 0
+
+    with tempfile.TemporaryDirectory() as tmp, contextlib.ExitStack() as stack:
+        # Each version has its own doctree cache in a subdirectory, which can be kept for later runs
+        if args.doctree_cache:
+            doctree_cache = os.path.abspath(args.doctree_cache)
+        else:
+            doctree_cache = stack.enter_context(tempfile.TemporaryDirectory())
+
         # Generate Metadata
         metadata = {}
         outputdirs = set()
-        for gitref in gitrefs:
-            # Clone Git repo
-            repopath = os.path.join(tmp, gitref.commit)
-            try:
-                git.copy_tree(gitroot, repopath, gitref)
-            except (OSError, subprocess.CalledProcessError):
-                logger.error(
-                    "Failed to copy git tree for %s to %s",
-                    gitref.refname,
-                    repopath,
-                )
-                continue
-
-            # Find config
-            confpath = os.path.join(repopath, confdir)
-            try:
-                current_config = _load_sphinx_config(confpath, confoverrides)
-            except (OSError, sphinx_config_error):
-                logger.error(
-                    "Failed load config for %s from %s",
-                    gitref.refname,
-                    confpath,
-                )
-                continue
+        # Clone Git repos in the background, refs pointing to the same commit share one copy. With a cache
+        # directory, copies are kept there by commit and reused by later runs
+        if args.cache_dir == "auto":
+            cache_dir = _get_default_cache_dir()
+        elif args.cache_dir:
+            cache_dir = os.path.abspath(args.cache_dir)
+        else:
+            cache_dir = tmp
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+            copy_futures = {}
+            docnames_futures = {}
+            # Versions often share the same source files, so look up their source directory trees in Git to
+            # find the files of each distinct tree only once
+            docnames_futures_by_tree: dict[tuple[Any, ...], concurrent.futures.Future[set[str]]] = {}
+            source_trees = _get_source_trees(gitroot, sourcedir, gitrefs)
+            for gitref in gitrefs:
+                if gitref.commit not in copy_futures:
+                    copy_futures[gitref.commit] = executor.submit(
+                        _copy_tree_cached, gitroot, os.path.join(cache_dir, gitref.commit), gitref, base_env
+                    )
 
-            # Ensure that there are not duplicate output dirs
-            outputdir = config.smv_outputdir_format.format(
-                ref=gitref,
-                config=current_config,
-            )
-            if outputdir in outputdirs:
-                logger.warning(
-                    "outputdir '%s' for %s conflicts with other versions",
-                    outputdir,
-                    gitref.refname,
-                )
-                continue
-            outputdirs.add(outputdir)
+            for gitref in gitrefs:
+                # Wait for the Git repo to be cloned
+                cachepath = os.path.join(cache_dir, gitref.commit)
+                repopath = os.path.join(cachepath, "tree")
+                try:
+                    copy_futures[gitref.commit].result()
+                except (OSError, subprocess.CalledProcessError):
+                    logger.error(
+                        "Failed to copy git tree for %s to %s",
+                        gitref.refname,
+                        repopath,
+                    )
+                    continue
 
-            # Get List of files
-            source_suffixes = current_config.source_suffix
-            if isinstance(source_suffixes, str):
-                source_suffixes = [current_config.source_suffix]
+                # Find config. Configs are loaded one at a time, as reading conf.py changes the working directory
+                # and the imported modules of the whole process
+                confpath = os.path.join(repopath, confdir)
+                try:
+                    if args.cache_dir:
+                        current_config = _load_cached_sphinx_config(cachepath, confpath, confoverrides, config_cache)
+                    else:
+                        current_config = _load_sphinx_config(confpath, confoverrides, config_cache)
+                except (OSError, sphinx_config_error):
+                    logger.error(
+                        "Failed load config for %s from %s",
+                        gitref.refname,
+                        confpath,
+                    )
+                    continue
 
-            current_sourcedir = os.path.join(repopath, sourcedir)
-            project = sphinx_project(current_sourcedir, source_suffixes)
-            metadata[gitref.name] = {
-                "name": gitref.name,
-                "version": current_config.version,
-                "release": gitref.name,
-                "rst_prolog": current_config.rst_prolog,
-                "is_released": bool(re.match(config.smv_released_pattern, gitref.refname)),
-                "source": gitref.source,
-                "creatordate": gitref.creatordate.strftime(sphinx.DATE_FMT),
-                "basedir": repopath,
-                "sourcedir": current_sourcedir,
-                "outputdir": os.path.join(os.path.abspath(args.outputdir), outputdir),
-                "confdir": confpath,
-                "docnames": list(project.discover()),
-            }
+                # Ensure that there are not duplicate output dirs
+                outputdir = config.smv_outputdir_format.format(
+                    ref=gitref,
+                    config=current_config,
+                )
+                if outputdir in outputdirs:
+                    logger.warning(
+                        "outputdir '%s' for %s conflicts with other versions",
+                        outputdir,
+                        gitref.refname,
+                    )
+                    continue
+                outputdirs.add(outputdir)
+
+                # Get List of files in the background, only the source directory of this version is accessed
+                source_suffixes = current_config.source_suffix
+                if isinstance(source_suffixes, str):
+                    source_suffixes = [current_config.source_suffix]
+
+                current_sourcedir = os.path.join(repopath, sourcedir)
+                tree_key = (source_trees.get(gitref.commit) or gitref.commit, tuple(source_suffixes))
+                if tree_key not in docnames_futures_by_tree:
+                    docnames_futures_by_tree[tree_key] = executor.submit(
+                        sphinx_project(current_sourcedir, source_suffixes).discover
+                    )
+                docnames_futures[gitref.name] = docnames_futures_by_tree[tree_key]
+                metadata[gitref.name] = {
+                    "name": gitref.name,
+                    "version": current_config.version,
+                    "release": gitref.name,
+                    "rst_prolog": current_config.rst_prolog,
+                    "is_released": bool(released_re.match(gitref.refname)),
+                    "source": gitref.source,
+                    "creatordate": gitref.creatordate.strftime(sphinx.DATE_FMT),
+                    "basedir": repopath,
+                    "sourcedir": current_sourcedir,
+                    "outputdir": os.path.join(os.path.abspath(args.outputdir), outputdir),
+                    "confdir": confpath,
+                }
+
+                if metadata[gitref.name]["is_released"]:
+                    released_versions.append(gitref.name)
 
-            if metadata[gitref.name]["is_released"]:
-                released_versions.append(gitref.name)
+            for name, docnames_future in docnames_futures.items():
+                metadata[name]["docnames"] = list(docnames_future.result())
 
         if args.dev_name:
-            # Find config of development version
-            try:
-                current_config = _load_sphinx_config(confdir_absolute, confoverrides)
-            except (OSError, sphinx_config_error) as e:
-                logger.error(
-                    "Failed load config for %s from %s",
-                    args.dev_name,
-                    confdir_absolute,
-                )
-                raise e
+            # Config of development version is the one loaded from the current directory above
+            current_config = config
 
             # Get List of files
             source_suffixes = current_config.source_suffix
@@ -378,7 +693,6 @@ def main(  # pylint: disable=too-many-branches,too-many-locals,too-many-statemen
                 source_suffixes = [current_config.source_suffix]
 
             current_sourcedir = os.path.join(gitroot, sourcedir)
-            project = sphinx_project(current_sourcedir, source_suffixes)
 
             metadata[args.dev_name] = {
                 "name": args.dev_name,
@@ -392,7 +706,7 @@ def main(  # pylint: disable=too-many-branches,too-many-locals,too-many-statemen
                 "sourcedir": confdir_absolute,
                 "outputdir": os.path.join(os.path.abspath(args.outputdir), args.dev_path or ""),
                 "confdir": confdir_absolute,
-                "docnames": list(project.discover()),
+                "docnames": list(sphinx_project(current_sourcedir, source_suffixes).discover()),
             }
 
         if args.dump_metadata:
@@ -414,13 +728,17 @@ def main(  # pylint: disable=too-many-branches,too-many-locals,too-many-statemen
                 redirection_path = os.path.join(os.path.pardir, "index.html")
             fp.write(_generate_html_redirection_page(redirection_path))
 
-        # Write Metadata
+        # Write Metadata. The file is only read by the sphinx extension, so it doesn't need to be indented
         metadata_path = os.path.abspath(os.path.join(tmp, "versions.json"))
         with open(metadata_path, mode="w", encoding="utf-8") as fp:
-            json.dump(metadata, fp, indent=2)
+            json.dump(metadata, fp, separators=(",", ":"))
 
         # Run Sphinx
         argv.extend(["-D", f"smv_metadata_path={metadata_path}"])
+        latest_version = released_versions[-1] if len(released_versions) > 0 else args.dev_name
+        # Parse the overrides only once, the values of each version are substituted in _build_version
+        define_templates = [string.Template(d) for d in args.define]
+        jobs: list[tuple[Any, ...]] = []
         for version_name, data in metadata.items():
             # When --skip-if-outputdir-exists flag passed, do not build version if its output
             # directory already exists. This does not check the contents of directory.
@@ -433,51 +751,46 @@ def main(  # pylint: disable=too-many-branches,too-many-locals,too-many-statemen
                     )
                     continue
 
-            os.makedirs(data["outputdir"], exist_ok=True)
-
-            defines = itertools.chain(*(("-D", string.Template(d).safe_substitute(data)) for d in args.define))
-
-            current_argv = argv.copy()
-            current_argv.extend(
-                [
-                    *defines,
-                    "-D",
-                    f"smv_latest_version={released_versions[-1] if len(released_versions) > 0 else args.dev_name}",
-                    "-D",
-                    f"smv_current_version={version_name}",
-                    "-c",
+            jobs.append(
+                (
+                    version_name,
+                    data,
+                    argv,
+                    args,
+                    define_templates,
+                    latest_version,
                     confdir_absolute,
-                    data["sourcedir"],
-                    data["outputdir"],
-                    *args.filenames,
-                ]
-            )
-            logger.debug("Running sphinx-build with args: %r", current_argv)
-            cmd = (
-                sys.executable,
-                *_get_python_flags(),
-                "-m",
-                "sphinx",
-                "-d",
-                doctree_cache,
-                *current_argv,
-            )
-            current_cwd = os.path.join(data["basedir"], cwd_relative)
-            env = os.environ.copy()
-            env.update(
-                {
-                    "SPHINX_MULTIVERSION_NAME": data["name"],
-                    "SPHINX_MULTIVERSION_VERSION": data["version"],
-                    "SPHINX_MULTIVERSION_RELEASE": data["release"],
-                    "SPHINX_MULTIVERSION_SOURCEDIR": data["sourcedir"],
-                    "SPHINX_MULTIVERSION_OUTPUTDIR": data["outputdir"],
-                    "SPHINX_MULTIVERSION_CONFDIR": data["confdir"],
-                }
+                    cwd_relative,
+                    doctree_cache,
+                    base_env,
+                )
             )
-            subprocess.check_call(cmd, cwd=current_cwd, env=env)
 
-            # Use "master" copy of static files for all documentation releases
-            if args.dev_name and (version_name != args.dev_name):
-                _update_static_path(data["outputdir"])
+        # Versions are built independently of each other, so run the builds in parallel. Refs pointing to the
+        # same commit share one source tree, which extensions like autosummary may write to, so those are built
+        # one after another. Rebuilding specific files is usually quick, so those builds are run sequentially
+        job_groups: dict[str, list[tuple[Any, ...]]] = {}
+        for job in jobs:
+            job_groups.setdefault(job[1]["basedir"], []).append(job)
+        build_jobs = 1 if args.filenames else min(len(job_groups), args.build_jobs or os.cpu_count() or 1)
+        if build_jobs > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=build_jobs) as build_executor:
+                build_futures = [build_executor.submit(_build_versions, group) for group in job_groups.values()]
+                try:
+                    for future in concurrent.futures.as_completed(build_futures):
+                        future.result()
+                except BaseException:
+                    # Don't wait for the queued builds before reporting the error
+                    build_executor.shutdown(cancel_futures=True)
+                    raise
+        else:
+            _build_versions(jobs)
+
+        # The static files of dev version exist only after it has been built, so link them afterwards
+        if args.dev_name and args.symlink_static:
+            dev_static_path = os.path.join(metadata[args.dev_name]["outputdir"], "_static")
+            for version_name, data, *_ in jobs:
+                if version_name != args.dev_name:
+                    _link_static_path(data["outputdir"], dev_static_path)
 
     return 0
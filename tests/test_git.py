@@ -0,0 +1,131 @@
+"""Unit tests for Git helper functions"""
+
+import datetime
+import os
+import subprocess
+import tempfile
+import unittest
+
+from sphinx_multiversion import git
+
+
+def _git(gitroot, *args):
+    subprocess.check_call(("git", *args), cwd=gitroot, stdout=subprocess.DEVNULL)
+
+
+class GitTestCase(unittest.TestCase):
+    """Unit tests for Git helper functions"""
+
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.gitroot = self._tmpdir.name
+        _git(self.gitroot, "init", "-q")
+        _git(self.gitroot, "config", "user.email", "test@example.com")
+        _git(self.gitroot, "config", "user.name", "Test")
+
+        os.makedirs(os.path.join(self.gitroot, "docs"))
+        with open(os.path.join(self.gitroot, "docs", "conf.py"), mode="w", encoding="utf-8") as f:
+            f.write("project = 'test'\n")
+        with open(os.path.join(self.gitroot, "README.rst"), mode="w", encoding="utf-8") as f:
+            f.write("Test\n")
+        _git(self.gitroot, "add", "-A")
+        _git(self.gitroot, "commit", "-q", "-m", "Add docs")
+        _git(self.gitroot, "tag", "v0.1.0")
+
+        _git(self.gitroot, "rm", "-q", "-r", "docs")
+        _git(self.gitroot, "commit", "-q", "-m", "Remove docs")
+        _git(self.gitroot, "tag", "v0.2.0")
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_cat_file_batch_exists(self):
+        """Test checking file existence with a single git cat-file process"""
+        with git.GitCatFileBatch(self.gitroot) as batch:
+            self.assertTrue(batch.exists("refs/tags/v0.1.0", "docs"))
+            self.assertTrue(batch.exists("refs/tags/v0.1.0", "docs/conf.py"))
+            self.assertFalse(batch.exists("refs/tags/v0.1.0", "docs/missing.py"))
+            self.assertFalse(batch.exists("refs/tags/v0.2.0", "docs/conf.py"))
+            self.assertFalse(batch.exists("refs/tags/nonexistent", "docs/conf.py"))
+
+    def test_cat_file_batch_exists_many(self):
+        """Test checking file existence of many files in one batch"""
+        queries = [(f"refs/tags/v0.{i % 2 + 1}.0", f"docs/{name}") for i in range(2000) for name in ("conf.py", "x")]
+        with git.GitCatFileBatch(self.gitroot) as batch:
+            found = batch.exists_many(queries)
+        self.assertEqual(
+            found,
+            {
+                ("refs/tags/v0.1.0", "docs/conf.py"): True,
+                ("refs/tags/v0.1.0", "docs/x"): False,
+                ("refs/tags/v0.2.0", "docs/conf.py"): False,
+                ("refs/tags/v0.2.0", "docs/x"): False,
+            },
+        )
+
+    def test_cat_file_batch_get_object_names(self):
+        """Test getting the hashes of files and trees in references"""
+        with git.GitCatFileBatch(self.gitroot) as batch:
+            objectnames = batch.get_object_names(
+                [("refs/tags/v0.1.0", ""), ("refs/tags/v0.1.0", "docs"), ("refs/tags/v0.2.0", "docs")]
+            )
+        for (refname, filename), objectname in list(objectnames.items())[:2]:
+            expected = subprocess.check_output(("git", "rev-parse", f"{refname}:{filename}"), cwd=self.gitroot)
+            self.assertEqual(objectname, expected.decode("ascii").strip())
+        self.assertIsNone(objectnames[("refs/tags/v0.2.0", "docs")])
+
+    def test_get_all_refs(self):
+        """Test listing references with their creation dates"""
+        output = subprocess.check_output(("git", "log", "-1", "--format=%cI", "v0.1.0"), cwd=self.gitroot, text=True)
+        refs = {ref.name: ref for ref in git.get_all_refs(self.gitroot)}
+        self.assertEqual(refs["v0.1.0"].source, "tags")
+        self.assertEqual(refs["v0.1.0"].refname, "refs/tags/v0.1.0")
+        self.assertFalse(refs["v0.1.0"].is_remote)
+        self.assertEqual(refs["v0.1.0"].creatordate, datetime.datetime.fromisoformat(output.strip()))
+        self.assertIsNotNone(refs["v0.1.0"].creatordate.tzinfo)
+
+    def test_get_all_refs_annotated_tag(self):
+        """Test that annotated tags refer to the tagged commit"""
+        _git(self.gitroot, "tag", "-a", "-m", "Annotated", "v0.1.1", "v0.1.0")
+        refs = {ref.name: ref for ref in git.get_all_refs(self.gitroot)}
+        self.assertEqual(refs["v0.1.1"].commit, refs["v0.1.0"].commit)
+
+    def test_get_all_refs_non_commit_tags(self):
+        """Test that tags which don't point to a commit are skipped"""
+        _git(self.gitroot, "tag", "treetag", "v0.1.0^{tree}")
+        _git(self.gitroot, "tag", "-a", "-m", "Annotated", "annotated-treetag", "v0.1.0^{tree}")
+        refs = git.get_all_refs(self.gitroot, ("refs/tags/",))
+        self.assertEqual(sorted(ref.name for ref in refs), ["v0.1.0", "v0.2.0"])
+
+    def test_get_refs_required_files(self):
+        """Test that references without required files are skipped"""
+        refs = git.get_refs(self.gitroot, r"^.*$", "$-", None, files=("docs", os.path.join("docs", "conf.py")))
+        self.assertEqual([ref.name for ref in refs], ["v0.1.0"])
+
+        refs = git.get_refs(self.gitroot, r"^.*$", "$-", None, files=(".",))
+        self.assertEqual([ref.name for ref in refs], ["v0.1.0", "v0.2.0"])
+
+    def test_get_refs_whitelists(self):
+        """Test filtering references by the whitelist patterns"""
+        _git(self.gitroot, "branch", "feature", "v0.1.0")
+        self.assertEqual([ref.name for ref in git.get_refs(self.gitroot, r"^v0\.2", None, None)], ["v0.2.0"])
+        self.assertEqual([ref.name for ref in git.get_refs(self.gitroot, None, r"^feat", None)], ["feature"])
+        self.assertEqual(list(git.get_refs(self.gitroot, None, None, r"^.*$")), [])
+
+    def test_copy_tree(self):
+        """Test copying the tree of a reference"""
+        ref = next(git.get_refs(self.gitroot, r"^v0\.1\.0$", "$-", None))
+        with tempfile.TemporaryDirectory() as dst:
+            git.copy_tree(self.gitroot, dst, ref)
+            with open(os.path.join(dst, "docs", "conf.py"), mode="r", encoding="utf-8") as f:
+                self.assertEqual(f.read(), "project = 'test'\n")
+        # The index of the repository is not modified
+        self.assertEqual(subprocess.check_output(("git", "status", "--porcelain"), cwd=self.gitroot), b"")
+
+    def test_copy_tree_sourcepath(self):
+        """Test copying only a subdirectory of the tree of a reference"""
+        ref = next(git.get_refs(self.gitroot, r"^v0\.1\.0$", "$-", None))
+        with tempfile.TemporaryDirectory() as dst:
+            git.copy_tree(self.gitroot, dst, ref, "docs")
+            self.assertEqual(os.listdir(dst), ["docs"])
+            self.assertEqual(os.listdir(os.path.join(dst, "docs")), ["conf.py"])
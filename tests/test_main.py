@@ -0,0 +1,215 @@
+"""Unit tests for the command line interface"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from sphinx_multiversion.main import (
+    _copy_tree_cached,
+    _create_argument_parser,
+    _get_version_sort_key,
+    _link_static_path,
+    _load_cached_sphinx_config,
+    _outputdir_format_uses_config,
+    _read_sphinx_config,
+    _update_static_path,
+)
+
+
+class UpdateStaticPathTestCase(unittest.TestCase):
+    """Unit tests for sharing static files between versions"""
+
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.outputdir = os.path.join(self._tmpdir.name, "versions", "v0.1.0")
+        self._write("index.html", '<link href="_static/basic.css">\n')
+        self._write(os.path.join("appendix", "faq.html"), '<link href="../_static/basic.css">\n')
+        self._write(os.path.join("_static", "basic.css"), "@import url('_static/font.css');\n")
+        self._write(os.path.join("_static", "script.js"), "var url = '_static/x';\n")
+        self._write("plain.html", "<p>No static files</p>\n")
+        self._write("empty.css", "")
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _write(self, path, content):
+        path = os.path.join(self.outputdir, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, mode="w", encoding="utf-8") as f:
+            f.write(content)
+
+    def _read(self, path):
+        with open(os.path.join(self.outputdir, path), mode="r", encoding="utf-8") as f:
+            return f.read()
+
+    def test_update_static_path(self):
+        """Test that HTML files point to the static files of the dev version"""
+        _update_static_path(self.outputdir)
+        self.assertEqual(self._read("index.html"), '<link href="../../_static/basic.css">\n')
+        self.assertEqual(self._read(os.path.join("appendix", "faq.html")), '<link href="../../../_static/basic.css">\n')
+        self.assertFalse(os.path.exists(os.path.join(self.outputdir, "_static")))
+
+    def test_update_static_path_skips_unchanged_files(self):
+        """Test that files without references to static files are not rewritten"""
+        path = os.path.join(self.outputdir, "plain.html")
+        os.utime(path, ns=(0, 0))
+        _update_static_path(self.outputdir)
+        self.assertEqual(os.stat(path).st_mtime_ns, 0)
+        self.assertEqual(self._read("plain.html"), "<p>No static files</p>\n")
+        self.assertEqual(self._read("empty.css"), "")
+        self.assertFalse(os.path.exists(os.path.join(self.outputdir, "index.html.tmp")))
+
+    def _create_dev_static_path(self):
+        dev_static_path = os.path.join(self._tmpdir.name, "_static")
+        os.makedirs(dev_static_path)
+        with open(os.path.join(dev_static_path, "basic.css"), mode="w", encoding="utf-8") as f:
+            f.write("/* dev */\n")
+        return dev_static_path
+
+    @unittest.skipUnless(os.name == "posix", "requires symbolic links")
+    def test_link_static_path(self):
+        """Test that the static folder is replaced with a link to the static folder of the dev version"""
+        _link_static_path(self.outputdir, self._create_dev_static_path())
+        static_path = os.path.join(self.outputdir, "_static")
+        self.assertEqual(os.readlink(static_path), os.path.join("..", "..", "_static"))
+        self.assertEqual(self._read(os.path.join("_static", "basic.css")), "/* dev */\n")
+        self.assertEqual(self._read("index.html"), '<link href="_static/basic.css">\n')
+
+    def test_link_static_path_hardlinks(self):
+        """Test that the files of the dev version are hard linked if symbolic links can't be created"""
+        dev_static_path = self._create_dev_static_path()
+        with mock.patch("os.symlink", side_effect=OSError):
+            _link_static_path(self.outputdir, dev_static_path)
+        static_path = os.path.join(self.outputdir, "_static")
+        self.assertFalse(os.path.islink(static_path))
+        self.assertEqual(os.listdir(static_path), ["basic.css"])
+        self.assertEqual(self._read(os.path.join("_static", "basic.css")), "/* dev */\n")
+
+
+class ArgumentParserTestCase(unittest.TestCase):
+    """Unit tests for the command line arguments"""
+
+    def test_cache_dir(self):
+        """Test that the cache directory option doesn't take the positional arguments"""
+        args, _ = _create_argument_parser().parse_known_args(["--cache-dir", "auto", "docs", "build"])
+        self.assertEqual((args.cache_dir, args.sourcedir, args.outputdir), ("auto", "docs", "build"))
+
+    def test_build_jobs(self):
+        """Test that the number of parallel builds must be positive"""
+        args, _ = _create_argument_parser().parse_known_args(["--build-jobs", "2", "docs", "build"])
+        self.assertEqual(args.build_jobs, 2)
+        for value in ("0", "-1", "x"):
+            with self.assertRaises(SystemExit), mock.patch("sys.stderr"):
+                _create_argument_parser().parse_known_args(["--build-jobs", value, "docs", "build"])
+
+
+class CopyTreeCachedTestCase(unittest.TestCase):
+    """Unit tests for keeping copies of git trees in a cache directory"""
+
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.cachepath = os.path.join(self._tmpdir.name, "0123abcd")
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    @staticmethod
+    def _copy_tree(gitroot, dst, reference, base_env=None):  # pylint: disable=unused-argument
+        with open(os.path.join(dst, "conf.py"), mode="w", encoding="utf-8") as f:
+            f.write(f"# {reference}\n")
+
+    def test_copy_tree_cached(self):
+        """Test that trees are copied once and reused afterwards"""
+        with mock.patch("sphinx_multiversion.git.copy_tree", side_effect=self._copy_tree) as copy_tree:
+            _copy_tree_cached("gitroot", self.cachepath, "first", {"PATH": "/bin"})
+            _copy_tree_cached("gitroot", self.cachepath, "second")
+        copy_tree.assert_called_once_with("gitroot", mock.ANY, "first", base_env={"PATH": "/bin"})
+        self.assertEqual(os.listdir(self.cachepath), ["tree"])
+
+    def test_copy_tree_cached_concurrent(self):
+        """Test that a tree completed by another run in the meantime is kept"""
+
+        def copy_tree(gitroot, dst, reference, base_env=None):  # pylint: disable=unused-argument
+            treepath = os.path.join(self.cachepath, "tree")
+            os.makedirs(treepath)
+            self._copy_tree(gitroot, treepath, "other")
+            self._copy_tree(gitroot, dst, reference)
+
+        with mock.patch("sphinx_multiversion.git.copy_tree", side_effect=copy_tree):
+            _copy_tree_cached("gitroot", self.cachepath, "this")
+        self.assertEqual(os.listdir(self.cachepath), ["tree"])
+        with open(os.path.join(self.cachepath, "tree", "conf.py"), mode="r", encoding="utf-8") as f:
+            self.assertEqual(f.read(), "# other\n")
+
+
+class VersionSortKeyTestCase(unittest.TestCase):
+    """Unit tests for sorting git refs by version"""
+
+    def test_get_version_sort_key(self):
+        """Test that refs are sorted by version, with refs not named after a version first"""
+        refnames = ["refs/tags/v1.10.0", "refs/heads/main", "refs/tags/v1.9.0", "refs/remotes/origin/develop"]
+        self.assertEqual(
+            sorted(refnames, key=_get_version_sort_key),
+            ["refs/remotes/origin/develop", "refs/heads/main", "refs/tags/v1.9.0", "refs/tags/v1.10.0"],
+        )
+
+
+class OutputdirFormatTestCase(unittest.TestCase):
+    """Unit tests for inspecting the outputdir format"""
+
+    def test_outputdir_format_uses_config(self):
+        """Test that references to the config of a version are found"""
+        self.assertFalse(_outputdir_format_uses_config("{ref.name}"))
+        self.assertFalse(_outputdir_format_uses_config("versions/{ref.source}/{ref.name}"))
+        self.assertTrue(_outputdir_format_uses_config("{config.version}/{ref.name}"))
+        self.assertTrue(_outputdir_format_uses_config("{config[release]}"))
+
+
+class ReadSphinxConfigTestCase(unittest.TestCase):
+    """Unit tests for reading sphinx configs in-process"""
+
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _create_confdir(self, name, version):
+        confdir = os.path.join(self._tmpdir.name, name)
+        os.makedirs(confdir)
+        with open(os.path.join(confdir, "smv_test_version.py"), mode="w", encoding="utf-8") as f:
+            f.write(f"VERSION = {version!r}\n")
+        with open(os.path.join(confdir, "conf.py"), mode="w", encoding="utf-8") as f:
+            f.write("import os, sys\nsys.path.insert(0, os.path.abspath('.'))\n")
+            f.write("from smv_test_version import VERSION as version\n")
+            f.write("os.environ['SMV_TEST_VERSION'] = version\n")
+            f.write("os.environ['SMV_TEST_EXISTING'] = version\n")
+        return confdir
+
+    def test_read_sphinx_config_isolation(self):
+        """Test that modules imported by conf.py are not shared between configs"""
+        self.addCleanup(os.environ.pop, "SMV_TEST_EXISTING", None)
+        os.environ["SMV_TEST_EXISTING"] = "initial"
+        initial_path = sys.path.copy()
+        config = _read_sphinx_config(self._create_confdir("a", "1.0"), {}, add_defaults=True)
+        self.assertEqual(config.version, "1.0")
+        self.assertEqual(config.smv_outputdir_format, "{ref.name}")
+        config = _read_sphinx_config(self._create_confdir("b", "2.0"), {}, add_defaults=False)
+        self.assertEqual(config.version, "2.0")
+        self.assertNotIn("smv_test_version", sys.modules)
+        self.assertEqual(sys.path, initial_path)
+        self.assertNotIn("SMV_TEST_VERSION", os.environ)
+        self.assertEqual(os.environ["SMV_TEST_EXISTING"], "initial")
+
+    def test_load_cached_sphinx_config(self):
+        """Test that configs are pickled to the cache directory and loaded from there by later runs"""
+        cachepath = self._tmpdir.name
+        confpath = self._create_confdir("a", "1.0")
+        config = _load_cached_sphinx_config(cachepath, confpath, {"release": "1.0.1"}, {})
+        self.assertEqual((config.version, config.release), ("1.0", "1.0.1"))
+        with mock.patch("sphinx_multiversion.main._load_sphinx_config") as load_sphinx_config:
+            config = _load_cached_sphinx_config(cachepath, confpath, {"release": "1.0.1"}, {})
+        load_sphinx_config.assert_not_called()
+        self.assertEqual((config.version, config.release), ("1.0", "1.0.1"))